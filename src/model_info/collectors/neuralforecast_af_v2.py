@@ -1,17 +1,27 @@
 # /mnt/e/env/ts/model_info/src/model_info/collectors/neuralforecast_af_v2.py
 from __future__ import annotations
+import hashlib
 import inspect
-from typing import Any, Dict, List, Tuple
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 import pandas as pd
 
+import neuralforecast
 import neuralforecast.auto as nf_auto
 
-from model_info.utils.text import SCALAR_TYPES, stable_repr, object_id, short_scalar, split_module
-from model_info.utils.web_cache import fetch_and_cache
+from model_info.utils.text import SCALAR_TYPES, stable_repr, object_id_from_repr, short_scalar, split_module
+from model_info.utils.web_cache import ensure_cached
 
 DEFAULT_MODELS_URL = "https://nixtlaverse.nixtla.io/neuralforecast/models.html"
 DEFAULT_LLMS_URL = "https://nixtlaverse.nixtla.io/llms.txt"
 
+# 出力スキーマを変えたら上げる（ディスク上の結果キャッシュを無効化する）
+RESULT_CACHE_VERSION = 3
+# 結果キャッシュは docs cache（git 管理）と分けて専用サブディレクトリに置く（.gitignore 済み）
+RESULT_CACHE_SUBDIR = "_results"
+
 PARAM_GROUP = {
     "h": "forecasting",
     "loss": "loss",
@@ -35,64 +45,139 @@ PARAM_GROUP = {
 def classify_param(pname: str) -> str:
     return PARAM_GROUP.get(pname, "other")
 
-def flatten_config(auto_name: str, obj: Any, key_path: str, config_rows: List[Dict[str, Any]], obj_rows: Dict[str, Dict[str, str]]) -> None:
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            kp = f"{key_path}.{k}" if key_path else str(k)
-            flatten_config(auto_name, v, kp, config_rows, obj_rows)
-        return
-    if isinstance(obj, (list, tuple)):
-        for i, v in enumerate(obj):
-            kp = f"{key_path}.{i}" if key_path else str(i)
-            flatten_config(auto_name, v, kp, config_rows, obj_rows)
-        return
-
-    if isinstance(obj, SCALAR_TYPES):
-        config_rows.append({
-            "auto_name": auto_name,
-            "key_path": key_path,
-            "value_kind": "scalar",
-            "value_scalar": short_scalar(obj),
-            "value_obj_id": "",
-        })
-        return
-
-    oid = object_id(obj)
+AF_MODELS_COLUMNS = ["auto_name", "module", "library", "namespace", "submodule", "doc",
+                     "has_default_config_attr", "has_get_default_config", "family"]
+AF_MODEL_PARAMS_COLUMNS = ["auto_name", "param", "required", "default_kind", "default_scalar", "default_obj_id", "kind"]
+AF_CONFIG_ENTRIES_COLUMNS = ["auto_name", "key_path", "value_kind", "value_scalar", "value_obj_id"]
+
+def _new_columns(columns: List[str]) -> Dict[str, List[Any]]:
+    # 行dictのリストではなく列ごとのリストで蓄積する（DataFrame化が速い）
+    return {c: [] for c in columns}
+
+def _sort_columns(cols: Dict[str, List[Any]], keys: List[str]) -> Dict[str, List[Any]]:
+    # 列リストを keys の辞書順で一括並べ替え（全列に同じ順序を適用）
+    sort_keys = list(zip(*(cols[k] for k in keys)))
+    order = sorted(range(len(sort_keys)), key=sort_keys.__getitem__)
+    return {c: [v[i] for i in order] for c, v in cols.items()}
+
+def _register_object(obj: Any, obj_rows: Dict[str, Tuple[str, str]], id_to_oid: Dict[int, Tuple[Any, str]]) -> str:
+    # 同一インスタンス（共有される loss 等）は id で即決し、repr+hash は identity ごとに1回だけ。
+    # id_to_oid はビルド単位の唯一の identity メモ。値側で obj を強参照するので、
+    # エントリがある間は id が再利用されず、ヒット時の同一性チェックは不要
+    k = id(obj)
+    hit = id_to_oid.get(k)
+    if hit is not None:
+        return hit[1]
+    # repr は1回だけ計算し、ID もそこから導く
+    r = stable_repr(obj)
+    oid = object_id_from_repr(obj, r)
     if oid not in obj_rows:
-        obj_rows[oid] = {"obj_id": oid, "py_type": str(type(obj)), "repr": stable_repr(obj)}
-    config_rows.append({
-        "auto_name": auto_name,
-        "key_path": key_path,
-        "value_kind": "object",
-        "value_scalar": "",
-        "value_obj_id": oid,
-    })
+        obj_rows[oid] = (str(type(obj)), r)
+    id_to_oid[k] = (obj, oid)
+    return oid
+
+# flatten_config のスタック上でコンテナの走査終了を表す印
+_LEAVE = object()
+
+def flatten_config(
+    auto_name: str,
+    root: Any,
+    root_key: str,
+    config_cols: Dict[str, List[Any]],
+    obj_rows: Dict[str, Tuple[str, str]],
+    id_to_oid: Optional[Dict[int, Tuple[Any, str]]] = None,
+) -> None:
+    if id_to_oid is None:
+        id_to_oid = {}
+    # 再帰ではなく明示的なスタックで走査（深いsearch spaceでも再帰上限に当たらない）
+    scalar_types = SCALAR_TYPES
+    add_auto = config_cols["auto_name"].append
+    add_key = config_cols["key_path"].append
+    add_kind = config_cols["value_kind"].append
+    add_scalar = config_cols["value_scalar"].append
+    add_oid = config_cols["value_obj_id"].append
+
+    # 現在の経路上にあるコンテナの id。自己参照（d["self"] = d 等）は展開せず object 行として出す
+    on_path = set()
+    stack: List[Tuple[Any, Any]] = [(root, root_key)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        obj, key_path = pop()
+        if obj is _LEAVE:
+            # key_path にはコンテナの id が入っている
+            on_path.discard(key_path)
+            continue
+        if isinstance(obj, (dict, list, tuple)) and id(obj) not in on_path:
+            cid = id(obj)
+            on_path.add(cid)
+            push((_LEAVE, cid))
+            if isinstance(obj, dict):
+                # 元の出現順で取り出せるよう逆順に積む
+                for k, v in reversed(list(obj.items())):
+                    push((v, f"{key_path}.{k}" if key_path else str(k)))
+            else:
+                for i in range(len(obj) - 1, -1, -1):
+                    push((obj[i], f"{key_path}.{i}" if key_path else str(i)))
+            continue
+
+        add_auto(auto_name)
+        add_key(key_path)
+
+        if isinstance(obj, scalar_types):
+            add_kind("scalar")
+            add_scalar(short_scalar(obj))
+            add_oid("")
+            continue
+
+        oid = _register_object(obj, obj_rows, id_to_oid)
+        add_kind("object")
+        add_scalar("")
+        add_oid(oid)
+
+_MISSING = object()
+
+_SKIP_PARAMS = frozenset(("self", "args", "kwargs"))
+
+def _get_signature(cls: Any) -> Optional[inspect.Signature]:
+    # 取得できないクラスは None（各クラスはビルド中に1回しか問い合わせないのでキャッシュしない）
+    try:
+        return inspect.signature(cls)
+    except Exception:
+        return None
 
 def try_get_default_config(cls: Any) -> Any:
-    if hasattr(cls, "default_config"):
-        try:
-            cfg = getattr(cls, "default_config")
+    # hasattr + getattr の二重参照を避け、sentinel 付き getattr 1回で判定する
+    try:
+        cfg = getattr(cls, "default_config", _MISSING)
+        if cfg is not _MISSING:
             if callable(cfg):
                 cfg = cfg()
             if isinstance(cfg, dict):
                 return cfg
-        except Exception:
-            pass
-    if hasattr(cls, "get_default_config"):
-        try:
-            fn = getattr(cls, "get_default_config")
-            if callable(fn):
-                cfg = fn()
-                if isinstance(cfg, dict):
-                    return cfg
-        except Exception:
-            pass
+    except Exception:
+        pass
+    try:
+        fn = getattr(cls, "get_default_config", _MISSING)
+        if fn is not _MISSING and callable(fn):
+            cfg = fn()
+            if isinstance(cfg, dict):
+                return cfg
+    except Exception:
+        pass
     return None
 
+def _result_signature(auto_names: List[str], models_html: str) -> str:
+    mtime = Path(models_html).stat().st_mtime_ns
+    version = getattr(neuralforecast, "__version__", "")
+    s = f"{RESULT_CACHE_VERSION}|{version}|{','.join(sorted(auto_names))}|{mtime}"
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=16).hexdigest()
+
 def build_neuralforecast_af_v2(
     cache_dir: str,
     models_url: str = DEFAULT_MODELS_URL,
     llms_url: str = DEFAULT_LLMS_URL,
+    use_cache: bool = True,
 ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Automatic Forecasting v2 (正規化スキーマ)
@@ -101,10 +186,13 @@ def build_neuralforecast_af_v2(
       C) af_model_params_df
       D) af_config_entries_df
       E) af_objects_df
+
+    use_cache=True の場合、neuralforecast のバージョン・Autoクラス集合・models.html の mtime が
+    同じなら <cache_dir>/_results/af_v2_<sig>.pkl から結果を返す（inspect/flatten を丸ごと省略）。
     """
     # docs cache（将来の拡張・差分検知用。現段階では保存するだけ）
-    _ = fetch_and_cache(models_url, f"{cache_dir}/models.html")
-    _ = fetch_and_cache(llms_url, f"{cache_dir}/llms.txt")
+    models_html = ensure_cached(models_url, f"{cache_dir}/models.html")
+    ensure_cached(llms_url, f"{cache_dir}/llms.txt")
 
     # Autoクラス一覧
     auto_classes = []
@@ -117,11 +205,34 @@ def build_neuralforecast_af_v2(
             continue
         auto_classes.append((name, cls))
 
-    models_rows = []
-    params_master: Dict[str, Dict[str, str]] = {}
-    model_params_rows = []
-    config_rows = []
-    obj_store: Dict[str, Dict[str, str]] = {}
+    result_path = Path(cache_dir) / RESULT_CACHE_SUBDIR / f"af_v2_{_result_signature([n for n, _ in auto_classes], models_html)}.pkl"
+    if use_cache and result_path.exists():
+        try:
+            return tuple(pd.read_pickle(result_path))  # type: ignore[return-value]
+        except Exception:
+            pass  # 壊れたキャッシュは作り直す
+
+    models_cols = _new_columns(AF_MODELS_COLUMNS)
+    # param -> (param_group, annotation)
+    params_master: Dict[str, Tuple[str, str]] = {}
+    model_params_cols = _new_columns(AF_MODEL_PARAMS_COLUMNS)
+    config_cols = _new_columns(AF_CONFIG_ENTRIES_COLUMNS)
+    # obj_id -> (py_type, repr)
+    obj_store: Dict[str, Tuple[str, str]] = {}
+    # id(obj) -> (obj, obj_id)。ビルド単位のメモ（関数終了で解放される）
+    id_to_oid: Dict[int, Tuple[Any, str]] = {}
+
+    # ループ内で使う関数・定数はローカルに束縛しておく
+    scalar_types = SCALAR_TYPES
+    empty = inspect.Parameter.empty
+    skip_params = _SKIP_PARAMS
+    add_mp_auto = model_params_cols["auto_name"].append
+    add_mp_param = model_params_cols["param"].append
+    add_mp_required = model_params_cols["required"].append
+    add_mp_default_kind = model_params_cols["default_kind"].append
+    add_mp_default_scalar = model_params_cols["default_scalar"].append
+    add_mp_default_obj_id = model_params_cols["default_obj_id"].append
+    add_mp_kind = model_params_cols["kind"].append
 
     for auto_name, cls in sorted(auto_classes, key=lambda x: x[0]):
         module = cls.__module__
@@ -130,29 +241,24 @@ def build_neuralforecast_af_v2(
         doc = inspect.getdoc(cls) or ""
         doc1 = doc.splitlines()[0] if doc else ""
 
-        models_rows.append({
-            "auto_name": auto_name,
-            "module": module,
-            "library": library,
-            "namespace": namespace,
-            "submodule": submodule,
-            "doc": doc1,
-            "has_default_config_attr": hasattr(cls, "default_config"),
-            "has_get_default_config": hasattr(cls, "get_default_config"),
-            "family": "",
-        })
+        models_cols["auto_name"].append(auto_name)
+        models_cols["module"].append(module)
+        models_cols["library"].append(library)
+        models_cols["namespace"].append(namespace)
+        models_cols["submodule"].append(submodule)
+        models_cols["doc"].append(doc1)
+        models_cols["has_default_config_attr"].append(hasattr(cls, "default_config"))
+        models_cols["has_get_default_config"].append(hasattr(cls, "get_default_config"))
+        models_cols["family"].append("")
 
         # signature解析（引数テーブルを正規化）
-        try:
-            sig = inspect.signature(cls)
-        except Exception:
-            sig = None
+        sig = _get_signature(cls)
 
         if sig is not None:
             for pname, p in sig.parameters.items():
-                if pname in ("self", "args", "kwargs"):
+                if pname in skip_params:
                     continue
-                required = (p.default is inspect._empty)
+                required = (p.default is empty)
 
                 default_kind = "empty"
                 default_scalar = ""
@@ -160,43 +266,63 @@ def build_neuralforecast_af_v2(
 
                 if not required:
                     dv = p.default
-                    if isinstance(dv, SCALAR_TYPES):
+                    if isinstance(dv, scalar_types):
                         default_kind = "scalar"
                         default_scalar = short_scalar(dv)
                     else:
                         default_kind = "object"
-                        oid = object_id(dv)
-                        default_obj_id = oid
-                        if oid not in obj_store:
-                            obj_store[oid] = {"obj_id": oid, "py_type": str(type(dv)), "repr": stable_repr(dv)}
+                        default_obj_id = _register_object(dv, obj_store, id_to_oid)
 
-                anno = "" if p.annotation is inspect._empty else (getattr(p.annotation, "__name__", None) or str(p.annotation))
+                anno = "" if p.annotation is empty else (getattr(p.annotation, "__name__", None) or str(p.annotation))
                 if pname not in params_master:
-                    params_master[pname] = {
-                        "param": pname,
-                        "param_group": classify_param(pname),
-                        "annotation": anno,
-                    }
-
-                model_params_rows.append({
-                    "auto_name": auto_name,
-                    "param": pname,
-                    "required": required,
-                    "default_kind": default_kind,
-                    "default_scalar": default_scalar,
-                    "default_obj_id": default_obj_id,
-                    "kind": str(p.kind),
-                })
+                    params_master[pname] = (classify_param(pname), anno)
+
+                add_mp_auto(auto_name)
+                add_mp_param(pname)
+                add_mp_required(required)
+                add_mp_default_kind(default_kind)
+                add_mp_default_scalar(default_scalar)
+                add_mp_default_obj_id(default_obj_id)
+                add_mp_kind(str(p.kind))
 
         # default_config の正規化（dict/listは別テーブルへ）
         cfg = try_get_default_config(cls)
         if isinstance(cfg, dict):
-            flatten_config(auto_name, cfg, "default_config", config_rows, obj_store)
+            flatten_config(auto_name, cfg, "default_config", config_cols, obj_store, id_to_oid)
 
-    af_models_df = pd.DataFrame(models_rows).sort_values(["auto_name"]).reset_index(drop=True)
-    af_params_df = pd.DataFrame(list(params_master.values())).sort_values(["param_group", "param"]).reset_index(drop=True)
-    af_model_params_df = pd.DataFrame(model_params_rows).sort_values(["auto_name", "param"]).reset_index(drop=True)
-    af_config_entries_df = pd.DataFrame(config_rows).sort_values(["auto_name", "key_path"]).reset_index(drop=True)
-    af_objects_df = pd.DataFrame(list(obj_store.values())).sort_values(["obj_id"]).reset_index(drop=True)
+    # pandas 側の sort_values(+コピー) を避け、Python のリスト上で並べてから DataFrame 化する
+    # models は auto_name 順に走査済みなので並べ替え不要
+    params_items = sorted(params_master.items(), key=lambda kv: (kv[1][0], kv[0]))
+    obj_items = sorted(obj_store.items())
 
-    return af_models_df, af_params_df, af_model_params_df, af_config_entries_df, af_objects_df
+    af_models_df = pd.DataFrame(models_cols)
+    af_params_df = pd.DataFrame({
+        "param": [k for k, _ in params_items],
+        "param_group": [v[0] for _, v in params_items],
+        "annotation": [v[1] for _, v in params_items],
+    })
+    af_model_params_df = pd.DataFrame(_sort_columns(model_params_cols, ["auto_name", "param"]))
+    af_config_entries_df = pd.DataFrame(_sort_columns(config_cols, ["auto_name", "key_path"]))
+    af_objects_df = pd.DataFrame({
+        "obj_id": [k for k, _ in obj_items],
+        "py_type": [v[0] for _, v in obj_items],
+        "repr": [v[1] for _, v in obj_items],
+    })
+
+    result = (af_models_df, af_params_df, af_model_params_df, af_config_entries_df, af_objects_df)
+    if use_cache:
+        result_path.parent.mkdir(parents=True, exist_ok=True)
+        # 並行ビルドと衝突しないよう一意な一時ファイルに書いてから置き換える
+        fd, tmp = tempfile.mkstemp(prefix=result_path.name + ".", suffix=".part", dir=result_path.parent)
+        os.close(fd)
+        try:
+            pd.to_pickle(result, tmp)
+            os.replace(tmp, result_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        # 入力が変わるたびに新しい署名のファイルができるので、古い結果は消しておく
+        for stale in result_path.parent.glob("af_v2_*.pkl"):
+            if stale != result_path:
+                stale.unlink(missing_ok=True)
+    return result
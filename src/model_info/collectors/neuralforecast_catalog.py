@@ -10,17 +10,21 @@ import pandas as pd
 import neuralforecast.models as nf_models
 import neuralforecast.auto as nf_auto
 
-from model_info.utils.web_cache import fetch_and_cache
+from model_info.utils.web_cache import ensure_cached, fetch_and_cache
 from model_info.utils.text import split_module
 
 DEFAULT_MODELS_URL = "https://nixtlaverse.nixtla.io/neuralforecast/models.html"
 DEFAULT_LLMS_URL = "https://nixtlaverse.nixtla.io/llms.txt"
 
-def _parse_automodel_family_map(html: str) -> Dict[str, str]:
-    # HTMLを粗くテキスト化
-    text = re.sub(r"<[^>]+>", "\n", html)
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+# タグ / 見出し / Auto* 名を1パスで文書順に拾う。タグ自体にもマッチさせて読み飛ばすことで
+# 属性値内の文字列は従来どおり無視する
+_FAMILY_SCAN_RE = re.compile(
+    r"<[^>]+>"
+    r"|(RNN-Based Models|Transformer-Based Models|CNN-Based Models|Linear and MLP Models|Specialized Models)"
+    r"|(\bAuto[A-Za-z0-9_]+\b)"
+)
 
+def _parse_automodel_family_map(html: str) -> Dict[str, str]:
     family = None
     fam_map: Dict[str, str] = {}
 
@@ -33,15 +37,12 @@ def _parse_automodel_family_map(html: str) -> Dict[str, str]:
         if "specialized" in h: return "Specialized"
         return "Other"
 
-    for ln in lines:
-        if ("RNN-Based Models" in ln or "Transformer-Based Models" in ln or "CNN-Based Models" in ln
-            or "Linear and MLP Models" in ln or "Specialized Models" in ln):
-            family = norm(ln)
-            continue
-        if family:
-            names = re.findall(r"\bAuto[A-Za-z0-9_]+\b", ln)
-            for n in names:
-                fam_map[n] = family
+    for m in _FAMILY_SCAN_RE.finditer(html):
+        header, name = m.group(1), m.group(2)
+        if header:
+            family = norm(header)
+        elif name and family:
+            fam_map[name] = family
 
     return fam_map
 
@@ -137,7 +138,7 @@ def build_neuralforecast_catalog(
     """
     # docs cache
     html = fetch_and_cache(models_url, f"{cache_dir}/models.html")
-    _ = fetch_and_cache(llms_url, f"{cache_dir}/llms.txt")
+    ensure_cached(llms_url, f"{cache_dir}/llms.txt")
 
     fam_map = _parse_automodel_family_map(html)
 
@@ -1,19 +1,54 @@
 # /mnt/e/env/ts/model_info/src/model_info/io/save_csv.py
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict
 import pandas as pd
 
-def save_df_csv(df: pd.DataFrame, path: str, encoding: str = "utf-8-sig") -> str:
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+def write_csv(df: pd.DataFrame, p: Path, encoding: str = "utf-8-sig", engine: str = "pandas") -> None:
+    """
+    engine="pandas"(既定): DataFrame.to_csv。既存CSVと同一の書式。
+    engine="pyarrow": pyarrow の C++ writer（高速だが書式が異なる: 文字列は全て引用符付き、
+      bool は true/false、整数値の float は小数点なしで出力）。UTF-8 系 encoding のみ。
+    """
+    if engine == "pyarrow":
+        # 任意依存。既定の pandas engine では import しない
+        try:
+            import pyarrow as pa
+            from pyarrow import csv as pacsv
+        except ImportError as e:
+            raise ImportError("engine='pyarrow' requires pyarrow") from e
+        enc = encoding.lower().replace("_", "-")
+        if enc not in ("utf-8", "utf8", "utf-8-sig"):
+            raise ValueError(f"engine='pyarrow' supports only UTF-8 encodings: {encoding}")
+        tbl = pa.Table.from_pandas(df, preserve_index=False)
+        with open(p, "wb") as f:
+            if enc == "utf-8-sig":
+                f.write(_UTF8_BOM)
+            pacsv.write_csv(tbl, f)
+        return
+    if engine != "pandas":
+        raise ValueError(f"unknown engine: {engine}")
+    df.to_csv(str(p), index=False, encoding=encoding)
+
+def save_df_csv(df: pd.DataFrame, path: str, encoding: str = "utf-8-sig", engine: str = "pandas") -> str:
     p = Path(path).resolve()
     p.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(str(p), index=False, encoding=encoding)
+    write_csv(df, p, encoding=encoding, engine=engine)
     return str(p)
 
-def save_many_csv(dfs: Dict[str, pd.DataFrame], out_dir: str, encoding: str = "utf-8-sig") -> Dict[str, str]:
+def save_many_csv(dfs: Dict[str, pd.DataFrame], out_dir: str, encoding: str = "utf-8-sig", engine: str = "pandas") -> Dict[str, str]:
     base = Path(out_dir).resolve()
     base.mkdir(parents=True, exist_ok=True)
-    out = {}
-    for name, df in dfs.items():
-        out[name] = save_df_csv(df, str(base / f"{name}.csv"), encoding=encoding)
-    return out
+    if not dfs:
+        return {}
+    # CSV 整形は GIL を保持したまま動くので、重なるのは OS への書き込み(ファイル I/O)部分だけ
+    with ThreadPoolExecutor(max_workers=min(8, len(dfs))) as ex:
+        # base は解決・作成済みなので各ファイルで resolve/mkdir し直さない
+        paths = {name: base / f"{name}.csv" for name in dfs}
+        futs = {name: ex.submit(write_csv, df, paths[name], encoding, engine) for name, df in dfs.items()}
+        for f in futs.values():
+            f.result()
+    return {name: str(p) for name, p in paths.items()}
@@ -4,7 +4,8 @@ from pathlib import Path
 from typing import Iterable, Tuple
 import pandas as pd
 
-from model_info.utils.text import slugify, split_module
+from model_info.io.save_csv import write_csv
+from model_info.utils.text import slugify
 
 def ensure_module_splits(df: pd.DataFrame, module_col: str = "module") -> pd.DataFrame:
     need = {"library", "namespace", "submodule_head", "submodule"}
@@ -12,39 +13,63 @@ def ensure_module_splits(df: pd.DataFrame, module_col: str = "module") -> pd.Dat
         return df
 
     out = df.copy()
-    cols = out[module_col].apply(lambda m: pd.Series(split_module(m)))
-    cols.columns = ["library", "namespace", "submodule_head", "submodule"]
-    out = pd.concat([out, cols], axis=1)
+    # split_module と同じ分割を列単位で行う（行ごとの pd.Series 生成を避ける）
+    mod = out[module_col].fillna("").astype(str)
+    parts = mod.str.split(".", n=2, expand=True).reindex(columns=range(3))
+    # 空フレームでは reindex で float64(NaN) 列になるので、.str の前に文字列化する
+    out["library"] = parts[0].fillna("").astype(str)
+    out["namespace"] = parts[1].fillna("").astype(str)
+    submodule = parts[2].fillna("").astype(str)
+    out["submodule_head"] = submodule.str.split(".", n=1).str[0].fillna("")
+    out["submodule"] = submodule
     return out
 
+def _slug_column(s: pd.Series) -> pd.Series:
+    # 旧実装(groupby(dropna=False) の NaN キー → slugify(nan))と同じく、None/NA は "nan" に寄せる
+    obj = s.astype(object)
+    # 反復の多いキー列なので category にして groupby を軽くする（保存対象の df2 の dtype は変えない）
+    return obj.where(obj.notna(), float("nan")).map(slugify).astype("category")
+
 def save_catalog_tree(
     df: pd.DataFrame,
     base_dir: str,
     catalog_name: str,
     group_cols: Tuple[str, ...] = ("library", "namespace", "kind", "family"),
     encoding: str = "utf-8-sig",
+    engine: str = "pandas",
 ) -> Tuple[str, str]:
     """
     1) 全体: <base_dir>/<catalog_name>/all.csv
     2) 分割: <base_dir>/<catalog_name>/<library>/<namespace>/<kind>/<family>/catalog.csv
     """
-    base = Path(base_dir).resolve()
-    out_root = (base / catalog_name).resolve()
+    out_root = (Path(base_dir) / catalog_name).resolve()
     out_root.mkdir(parents=True, exist_ok=True)
 
     df2 = ensure_module_splits(df)
 
     all_path = out_root / "all.csv"
-    df2.to_csv(str(all_path), index=False, encoding=encoding)
+    write_csv(df2, all_path, encoding=encoding, engine=engine)
 
     cols = [c for c in group_cols if c in df2.columns]
     if cols:
-        for key, g in df2.groupby(cols, dropna=False):
+        # パス要素(slug)を列ごとに一度だけ計算し、slug の組でまとめて分割する
+        slugs = pd.DataFrame({c: _slug_column(df2[c]) for c in cols})
+        groups = []
+        for key, idx in slugs.groupby(cols, sort=False, observed=True).indices.items():
             key_tuple = key if isinstance(key, tuple) else (key,)
-            subdir = out_root
-            for v in key_tuple:
-                subdir = subdir / slugify(v)
-            subdir.mkdir(parents=True, exist_ok=True)
-            g.to_csv(str(subdir / "catalog.csv"), index=False, encoding=encoding)
+            groups.append((key_tuple, idx))
+
+        # 先にディレクトリをまとめて作る。共通の親は1度だけ mkdir する
+        made = set()
+        for key_tuple, _ in groups:
+            for depth in range(1, len(key_tuple) + 1):
+                prefix = key_tuple[:depth]
+                if prefix in made:
+                    continue
+                out_root.joinpath(*prefix).mkdir(exist_ok=True)
+                made.add(prefix)
+
+        for key_tuple, idx in groups:
+            write_csv(df2.iloc[idx], out_root.joinpath(*key_tuple, "catalog.csv"), encoding=encoding, engine=engine)
 
     return str(all_path), str(out_root)
@@ -2,26 +2,51 @@
 from __future__ import annotations
 import re
 import hashlib
-from typing import Any, Tuple
+import types
+from typing import Any, Optional, Tuple
 
 SCALAR_TYPES = (type(None), bool, int, float, str)
 
+_ADDR_RE = re.compile(r"0x[0-9a-fA-F]+")
+_SLUG_RE = re.compile(r"[^\w\-.]+")
+
+_PLAIN_FUNCTION_TYPES = (types.FunctionType, types.BuiltinFunctionType)
+
 def slugify(x: Any, max_len: int = 120) -> str:
     s = "" if x is None else str(x).strip()
     if not s:
         return "_unknown"
-    s = re.sub(r"[^\w\-.]+", "_", s)
+    s = _SLUG_RE.sub("_", s)
     return s[:max_len]
 
 def stable_repr(x: Any) -> str:
     s = repr(x)
     # メモリアドレス 0x... を消して差分比較しやすくする
-    s = re.sub(r"0x[0-9a-fA-F]+", "0xADDR", s)
+    s = _ADDR_RE.sub("0xADDR", s)
     return s
 
+def _named_id_source(x: Any) -> Optional[str]:
+    # クラスと素の関数だけは import パスで識別できるので repr を呼ばない。
+    # bound method 等（__self__ を持つもの）は束縛先で区別が必要なので None（repr に回す）
+    if isinstance(x, type) or (isinstance(x, _PLAIN_FUNCTION_TYPES) and not hasattr(x, "__self__")):
+        qualname = getattr(x, "__qualname__", None)
+        if isinstance(qualname, str):
+            t = type(x)
+            return f"{t.__module__}.{t.__qualname__}|{getattr(x, '__module__', '')}.{qualname}"
+    return None
+
+def _hash_id(s: str) -> str:
+    # 暗号強度は不要。blake2b(6byte) で12桁hexのIDを直接得る
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=6).hexdigest()
+
+def object_id_from_repr(x: Any, r: str) -> str:
+    """stable_repr(x) を計算済みの呼び出し側向け。object_id(x) と同じIDを repr を再計算せずに返す。"""
+    s = _named_id_source(x)
+    return _hash_id(s if s is not None else f"{type(x)}|{r}")
+
 def object_id(x: Any) -> str:
-    s = f"{type(x)}|{stable_repr(x)}"
-    return hashlib.sha1(s.encode("utf-8")).hexdigest()[:12]
+    s = _named_id_source(x)
+    return _hash_id(s if s is not None else f"{type(x)}|{stable_repr(x)}")
 
 def split_module(module: str) -> Tuple[str, str, str, str]:
     parts = (module or "").split(".")
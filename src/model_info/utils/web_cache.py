@@ -1,16 +1,86 @@
 # /mnt/e/env/ts/model_info/src/model_info/utils/web_cache.py
 from __future__ import annotations
+from email.utils import formatdate
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import requests
 
+# 同一プロセス内での再読込・再デコードを避けるためのテキストキャッシュ
+# resolved path -> (st_mtime_ns, text)。mtime が変わっていれば（他プロセスによる更新など）読み直す
+_TEXT_CACHE: Dict[str, Tuple[int, str]] = {}
+
+_CHUNK_SIZE = 65536
+
+def _mtime_ns(p: Path) -> Optional[int]:
+    try:
+        return p.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _etag_path(p: Path) -> Path:
+    return p.with_name(p.name + ".etag")
+
+def _download(url: str, p: Path, timeout: int) -> bool:
+    """
+    url を p へストリーム保存する。既存ファイルがあれば ETag / If-Modified-Since で条件付き取得し、
+    未更新(304)なら書き換えない。内容を書き換えた場合 True。
+    """
+    headers = {}
+    etag_p = _etag_path(p)
+    if p.exists():
+        headers["If-Modified-Since"] = formatdate(p.stat().st_mtime, usegmt=True)
+        if etag_p.exists():
+            headers["If-None-Match"] = etag_p.read_text(encoding="utf-8").strip()
+
+    with requests.get(url, timeout=timeout, stream=True, headers=headers) as r:
+        if r.status_code == 304:
+            return False
+        r.raise_for_status()
+        # 途中で失敗しても既存キャッシュを壊さないよう一時ファイル経由で置き換える
+        tmp = p.with_name(p.name + ".part")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=_CHUNK_SIZE):
+                    f.write(chunk)
+            tmp.replace(p)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        etag = r.headers.get("ETag")
+    if etag:
+        etag_p.write_text(etag, encoding="utf-8")
+    else:
+        # 古い validator を次回送らないよう消しておく
+        etag_p.unlink(missing_ok=True)
+    return True
+
+def _ensure_file(url: str, p: Path, timeout: int, force: bool) -> None:
+    # ファイルが無い / force のときだけ取得する（既存ファイルは読まない）
+    if force or not p.exists():
+        p.parent.mkdir(parents=True, exist_ok=True)
+        _download(url, p, timeout)
+
 def fetch_and_cache(url: str, cache_path: str, timeout: int = 30, force: bool = False) -> str:
     p = Path(cache_path).resolve()
-    p.parent.mkdir(parents=True, exist_ok=True)
-    if p.exists() and not force:
-        return p.read_text(encoding="utf-8", errors="ignore")
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    text = r.text
-    p.write_text(text, encoding="utf-8")
+    key = str(p)
+    mtime = _mtime_ns(p)
+    if not force and mtime is not None:
+        hit = _TEXT_CACHE.get(key)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+    _ensure_file(url, p, timeout, force or mtime is None)
+    mtime = _mtime_ns(p)
+    hit = _TEXT_CACHE.get(key)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    text = p.read_text(encoding="utf-8", errors="ignore")
+    _TEXT_CACHE[key] = (mtime, text)
     return text
+
+def ensure_cached(url: str, cache_path: str, timeout: int = 30, force: bool = False) -> str:
+    """
+    ファイルの存在だけを保証する（既存なら読み込み・デコードしない）。保存先パスを返す。
+    """
+    p = Path(cache_path).resolve()
+    _ensure_file(url, p, timeout, force)
+    return str(p)